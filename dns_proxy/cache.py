@@ -1,11 +1,15 @@
 import time
 import threading
-from typing import Dict, Optional, Tuple, Any
+from itertools import islice
+from typing import Dict, Hashable, Optional, Tuple, Any
 from collections import OrderedDict
 
 class DNSCache:
     """Thread-safe DNS cache with TTL support"""
     
+    # Entries inspected per lookup when sweeping expired ones, so no get() walks the whole cache
+    CLEANUP_BATCH = 16
+    
     def __init__(self, max_size: int = 10000, default_ttl: int = 300):
         self.max_size = max_size
         self.default_ttl = default_ttl
@@ -13,26 +17,26 @@ class DNSCache:
         self._lock = threading.RLock()
         self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
     
-    def _cleanup_expired(self):
-        """Remove expired entries"""
-        current_time = time.time()
+    def _cleanup_expired(self, now: float):
+        """Remove expired entries among the least recently used ones"""
         expired_keys = []
         
-        for key, (data, expiry) in self._cache.items():
-            if current_time > expiry:
+        for key, (data, expiry) in islice(self._cache.items(), self.CLEANUP_BATCH):
+            if now > expiry:
                 expired_keys.append(key)
         
         for key in expired_keys:
             del self._cache[key]
     
-    def get(self, key: str) -> Optional[Any]:
+    def get(self, key: Hashable) -> Optional[Any]:
         """Get cached DNS response"""
         with self._lock:
-            self._cleanup_expired()
+            now = time.monotonic()
+            self._cleanup_expired(now)
             
             if key in self._cache:
                 data, expiry = self._cache[key]
-                if time.time() <= expiry:
+                if now <= expiry:
                     # Move to end (LRU)
                     self._cache.move_to_end(key)
                     self._stats['hits'] += 1
@@ -43,13 +47,13 @@ class DNSCache:
             self._stats['misses'] += 1
             return None
     
-    def set(self, key: str, data: Any, ttl: Optional[int] = None):
+    def set(self, key: Hashable, data: Any, ttl: Optional[int] = None):
         """Cache DNS response"""
         with self._lock:
             if ttl is None:
                 ttl = self.default_ttl
             
-            expiry = time.time() + ttl
+            expiry = time.monotonic() + ttl
             
             # Remove oldest entries if cache is full
             while len(self._cache) >= self.max_size:
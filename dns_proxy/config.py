@@ -1,5 +1,4 @@
 import configparser
-import os
 import sys
 import logging
 from typing import Dict, Any, Optional
@@ -14,7 +13,9 @@ class DNSProxyConfig:
             'listen-address': '0.0.0.0',
             'user': 'dns-proxy',
             'group': 'dns-proxy',
-            'pid-file': '/var/run/dns-proxy.pid'
+            'pid-file': '/var/run/dns-proxy.pid',
+            'reuse-port': 'false',
+            'workers': '1'
         },
         'forwarder-dns': {
             'server-address': '8.8.8.8',
@@ -46,20 +47,17 @@ class DNSProxyConfig:
     
     def _load_defaults(self):
         """Load default configuration"""
-        for section, options in self.DEFAULT_CONFIG.items():
-            self.config.add_section(section)
-            for key, value in options.items():
-                self.config.set(section, key, value)
+        self.config.read_dict(self.DEFAULT_CONFIG)
     
     def _load_config(self):
         """Load configuration from file"""
-        if os.path.exists(self.config_path):
-            try:
-                self.config.read(self.config_path)
-            except Exception as e:
-                print(f"Error reading config file {self.config_path}: {e}", file=sys.stderr)
-                sys.exit(1)
-        else:
+        try:
+            # read() skips files it cannot open, so an empty result means not found
+            found = self.config.read(self.config_path)
+        except Exception as e:
+            print(f"Error reading config file {self.config_path}: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not found:
             print(f"Warning: Config file {self.config_path} not found, using defaults")
     
     def get(self, section: str, option: str, fallback: Any = None) -> str:
@@ -1,16 +1,60 @@
 import logging
 import socket
 import struct
-import random
 from typing import List, Dict, Any, Optional, Tuple
 from twisted.internet import reactor, defer, protocol
 from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
 from twisted.names import dns, client, common
 from twisted.names.error import DNSQueryRefusedError, DNSServerError
 from dns_proxy.cache import DNSCache
 
 logger = logging.getLogger(__name__)
 
+# DNS over TCP 2-byte length prefix, precompiled for the per-message path
+_LEN = struct.Struct('!H')
+_pack_len = _LEN.pack
+_unpack_len = _LEN.unpack_from
+
+# Fixed DNS header: id, flags, qdcount, ancount, nscount, arcount
+_HDR = struct.Struct('!6H')
+_DNS_HEADER_SIZE = _HDR.size
+# Smallest possible question (root name + type + class) and resource record
+_MIN_QUESTION_SIZE = 5
+_MIN_RR_SIZE = 11
+
+def _header_error(data: bytes) -> Optional[str]:
+    """Cheap sanity check of the DNS header before a full parse, returns a rejection reason or None"""
+    if len(data) < _DNS_HEADER_SIZE:
+        return "shorter than DNS header"
+    
+    _, _, qdcount, ancount, nscount, arcount = _HDR.unpack_from(data, 0)
+    if qdcount == 0:
+        return "no queries"
+    if qdcount * _MIN_QUESTION_SIZE + (ancount + nscount + arcount) * _MIN_RR_SIZE > len(data) - _DNS_HEADER_SIZE:
+        return "record counts exceed packet size"
+    return None
+
+_CNAME_TYPES = frozenset((dns.CNAME,))
+_AAAA_TYPES = frozenset((dns.AAAA,))
+_CNAME_AAAA_TYPES = frozenset((dns.CNAME, dns.AAAA))
+# Query types that get CNAME flattening
+_ADDRESS_TYPES = frozenset((dns.A, dns.AAAA))
+
+def _count_types(records: List[dns.RRHeader], types: frozenset) -> int:
+    """Count records whose type is in types"""
+    return sum(1 for rr in records if rr.type in types)
+
+def _strip_types(message: dns.Message, types: frozenset) -> int:
+    """Drop records of the given types from all sections, returning how many were removed"""
+    removed = 0
+    for section in ('answers', 'authority', 'additional'):
+        records = getattr(message, section)
+        kept = [rr for rr in records if rr.type not in types]
+        removed += len(records) - len(kept)
+        setattr(message, section, kept)
+    return removed
+
 class DNSMessage:
     """DNS Message wrapper for easier manipulation"""
     
@@ -53,7 +97,7 @@ class CNAMEFlattener:
     def resolve_cname_chain(self, name: str, recursion_count: int = 0) -> List[str]:
         """Resolve CNAME chain to final A record names"""
         if recursion_count >= self.max_recursion:
-            logger.warning(f"Max CNAME recursion reached for {name}")
+            logger.warning("Max CNAME recursion reached for %s", name)
             defer.returnValue([])
         
         # Check cache first
@@ -68,7 +112,7 @@ class CNAMEFlattener:
             if result and result[0]:
                 cname_record = result[0][0]
                 target = str(cname_record.name)
-                logger.debug(f"CNAME: {name} -> {target}")
+                logger.debug("CNAME: %s -> %s", name, target)
                 
                 # Recursively resolve the target
                 chain = yield self.resolve_cname_chain(target, recursion_count + 1)
@@ -82,7 +126,7 @@ class CNAMEFlattener:
                 defer.returnValue([])
                 
         except Exception as e:
-            logger.debug(f"No CNAME found for {name}: {e}")
+            logger.debug("No CNAME found for %s: %s", name, e)
             defer.returnValue([])
     
     @defer.inlineCallbacks
@@ -93,20 +137,20 @@ class CNAMEFlattener:
         if not cname_records:
             defer.returnValue(dns_msg)
         
-        logger.debug(f"Flattening {len(cname_records)} CNAME records for {original_query_name}")
+        logger.debug("Flattening %d CNAME records for %s", len(cname_records), original_query_name)
         
         # Get all A records that should replace CNAMEs
         all_a_records = []
         
         for cname_rr in cname_records:
             target_name = str(cname_rr.payload.name)
-            logger.debug(f"Resolving CNAME target: {target_name}")
+            logger.debug("Resolving CNAME target: %s", target_name)
             
             try:
                 # Resolve target to A records
                 a_result = yield self.upstream_resolver.lookupAddress(target_name)
                 if a_result and a_result[0]:
-                    logger.debug(f"Found {len(a_result[0])} A records for {target_name}")
+                    logger.debug("Found %d A records for %s", len(a_result[0]), target_name)
                     for a_rr in a_result[0]:
                         # Create new A record with original query name
                         new_a_record = dns.RRHeader(
@@ -117,26 +161,26 @@ class CNAMEFlattener:
                             payload=a_rr.payload
                         )
                         all_a_records.append(new_a_record)
-                        logger.debug(f"Created A record: {original_query_name} -> {a_rr.payload.dottedQuad()}")
+                        logger.debug("Created A record: %s -> %s", original_query_name, a_rr.payload.dottedQuad())
                 else:
-                    logger.warning(f"No A records found for CNAME target {target_name}")
+                    logger.warning("No A records found for CNAME target %s", target_name)
                         
             except Exception as e:
-                logger.warning(f"Failed to resolve CNAME target {target_name}: {e}")
+                logger.warning("Failed to resolve CNAME target %s: %s", target_name, e)
         
         if all_a_records:
             # Replace CNAME records with A records
             dns_msg.answers = [rr for rr in dns_msg.answers if rr.type != dns.CNAME]
             dns_msg.answers.extend(all_a_records)
-            logger.info(f"Flattened CNAMEs for {original_query_name}: {len(all_a_records)} A records")
+            logger.info("Flattened CNAMEs for %s: %d A records", original_query_name, len(all_a_records))
         else:
-            logger.warning(f"No A records found after flattening CNAMEs for {original_query_name}")
+            logger.warning("No A records found after flattening CNAMEs for %s", original_query_name)
         
         # Remove AAAA records as requested
         aaaa_count = len([rr for rr in dns_msg.answers if rr.type == dns.AAAA])
         dns_msg.remove_aaaa_records()
         if aaaa_count > 0:
-            logger.debug(f"Removed {aaaa_count} AAAA records for {original_query_name}")
+            logger.debug("Removed %d AAAA records for %s", aaaa_count, original_query_name)
         
         defer.returnValue(dns_msg)
 
@@ -150,6 +194,9 @@ class DNSProxyResolver:
         self.cache = cache or DNSCache()
         self.remove_aaaa = remove_aaaa
         
+        # Waiters for queries currently being resolved upstream, keyed like the cache
+        self._inflight: Dict[Tuple[bytes, int], List[Deferred]] = {}
+        
         # Create upstream resolver
         self.upstream_resolver = client.Resolver(
             servers=[(upstream_server, upstream_port)],
@@ -163,20 +210,81 @@ class DNSProxyResolver:
             self.cache
         )
     
-    @defer.inlineCallbacks
-    def resolve_query(self, query: dns.Query) -> dns.Message:
+    def _warm_chain_cache(self, query_name: str, cname_records: List[dns.RRHeader],
+                          a_records: List[dns.RRHeader]):
+        """Cache flattened A responses for the intermediate CNAME targets"""
+        # Index the chain by owner name; DNS names compare case-insensitively
+        aliases = {rr.name.name.lower(): rr for rr in cname_records}
+        a_by_owner: Dict[bytes, List[dns.RRHeader]] = {}
+        for a_rr in a_records:
+            a_by_owner.setdefault(a_rr.name.name.lower(), []).append(a_rr)
+
+        for cname_rr in cname_records:
+            target = cname_rr.payload.name.name
+            if str(cname_rr.payload.name) == query_name:
+                continue
+
+            # Follow the chain from this target, so only its own remaining hops bound the TTL
+            ttl = 300
+            name = target.lower()
+            seen = set()
+            while name in aliases and name not in seen:
+                seen.add(name)
+                hop = aliases[name]
+                ttl = min(ttl, hop.ttl)
+                name = hop.payload.name.name.lower()
+
+            terminal = a_by_owner.get(name)
+            if not terminal:
+                continue
+            ttl = min([ttl] + [a_rr.ttl for a_rr in terminal])
+
+            response = dns.Message()
+            response.answers = [
+                dns.RRHeader(name=target, type=dns.A, cls=dns.IN, ttl=a_rr.ttl, payload=a_rr.payload)
+                for a_rr in terminal
+            ]
+            self.cache.set((target, dns.A), response, ttl=ttl)
+            logger.debug("Warmed cache for CNAME target %s (%d A records)", cname_rr.payload.name, len(terminal))
+
+    def resolve_query(self, query: dns.Query) -> Deferred:
         """Resolve DNS query with CNAME flattening"""
-        query_name = str(query.name)
-        query_type = query.type
-        
-        # Create cache key
-        cache_key = f"{query_name}:{query_type}"
+        # Key on the wire-format name bytes so cache hits skip the str() conversion
+        cache_key = (query.name.name, query.type)
         
         # Check cache first
         cached_response = self.cache.get(cache_key)
         if cached_response:
-            logger.debug(f"Cache hit for {query_name}")
-            defer.returnValue(cached_response)
+            logger.debug("Cache hit for %s", query.name)
+            return defer.succeed(cached_response)
+        
+        # Collapse concurrent identical queries onto the one already sent upstream
+        waiters = self._inflight.get(cache_key)
+        if waiters is not None:
+            logger.debug("Joining in-flight upstream query for %s", query.name)
+            d = Deferred()
+            waiters.append(d)
+            return d
+        
+        self._inflight[cache_key] = []
+        d = self._resolve_upstream(query, cache_key)
+        d.addBoth(self._release_waiters, cache_key)
+        return d
+    
+    def _release_waiters(self, result, cache_key: Tuple[bytes, int]):
+        """Hand an upstream result to every query that joined it while in flight"""
+        for waiter in self._inflight.pop(cache_key, ()):
+            if isinstance(result, Failure):
+                waiter.errback(result)
+            else:
+                waiter.callback(result)
+        return result
+    
+    @defer.inlineCallbacks
+    def _resolve_upstream(self, query: dns.Query, cache_key: Tuple[bytes, int]) -> dns.Message:
+        """Forward a query upstream, flatten CNAMEs and cache the result"""
+        query_name = str(query.name)
+        query_type = query.type
         
         try:
             # Forward query to upstream - returns (answers, authority, additional)
@@ -190,42 +298,52 @@ class DNSProxyResolver:
                 response.authority = list(authority) 
                 response.additional = list(additional)
                 
-                # Debug: Log what we got from upstream
-                logger.debug(f"Upstream response for {query_name}:")
-                logger.debug(f"  Answers: {len(response.answers)} records")
-                for i, rr in enumerate(response.answers):
-                    try:
-                        if rr.type == dns.CNAME:
-                            target = str(rr.payload.name)
-                            logger.debug(f"    [{i}] CNAME: {rr.name} -> {target} (TTL: {rr.ttl})")
-                        elif rr.type == dns.A:
-                            ip = rr.payload.dottedQuad()
-                            logger.debug(f"    [{i}] A: {rr.name} -> {ip} (TTL: {rr.ttl})")
-                        elif rr.type == dns.AAAA:
-                            logger.debug(f"    [{i}] AAAA: {rr.name} -> {rr.payload} (TTL: {rr.ttl})")
-                        else:
-                            logger.debug(f"    [{i}] {dns.QUERY_TYPES.get(rr.type, rr.type)}: {rr.name} -> {rr.payload} (TTL: {rr.ttl})")
-                    except Exception as e:
-                        logger.debug(f"    [{i}] {dns.QUERY_TYPES.get(rr.type, rr.type)}: {rr.name} (debug error: {e})")
+                # Debug: Log what we got from upstream (skip building the dump unless DEBUG is on)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Upstream response for %s:", query_name)
+                    logger.debug("  Answers: %s records", len(response.answers))
+                    for i, rr in enumerate(response.answers):
+                        try:
+                            if rr.type == dns.CNAME:
+                                target = str(rr.payload.name)
+                                logger.debug("    [%s] CNAME: %s -> %s (TTL: %s)", i, rr.name, target, rr.ttl)
+                            elif rr.type == dns.A:
+                                ip = rr.payload.dottedQuad()
+                                logger.debug("    [%s] A: %s -> %s (TTL: %s)", i, rr.name, ip, rr.ttl)
+                            elif rr.type == dns.AAAA:
+                                logger.debug("    [%s] AAAA: %s -> %s (TTL: %s)", i, rr.name, rr.payload, rr.ttl)
+                            else:
+                                logger.debug("    [%s] %s: %s -> %s (TTL: %s)", i, dns.QUERY_TYPES.get(rr.type, rr.type), rr.name, rr.payload, rr.ttl)
+                        except Exception as e:
+                            logger.debug("    [%s] %s: %s (debug error: %s)", i, dns.QUERY_TYPES.get(rr.type, rr.type), rr.name, e)
                 
-                logger.debug(f"  Authority: {len(response.authority)} records")
-                logger.debug(f"  Additional: {len(response.additional)} records")
+                    logger.debug("  Authority: %s records", len(response.authority))
+                    logger.debug("  Additional: %s records", len(response.additional))
                 
                 # For A record queries, do CNAME flattening
-                if query_type == dns.A or query_type == dns.AAAA:
+                if query_type in _ADDRESS_TYPES:
+                    # Partition the answer section in a single pass
+                    cname_in_answers = []
+                    a_records_from_chain = []
+                    aaaa_records_from_chain = []
+                    for rr in response.answers:
+                        rr_type = rr.type
+                        if rr_type == dns.CNAME:
+                            cname_in_answers.append(rr)
+                        elif rr_type == dns.A:
+                            a_records_from_chain.append(rr)
+                        elif rr_type == dns.AAAA:
+                            aaaa_records_from_chain.append(rr)
+                    
                     # Check if we have any CNAME records in ANY section
-                    cname_in_answers = [rr for rr in response.answers if rr.type == dns.CNAME]
-                    cname_in_authority = [rr for rr in response.authority if rr.type == dns.CNAME]
-                    cname_in_additional = [rr for rr in response.additional if rr.type == dns.CNAME]
+                    cname_in_authority = _count_types(response.authority, _CNAME_TYPES)
+                    cname_in_additional = _count_types(response.additional, _CNAME_TYPES)
                     
-                    total_cnames = len(cname_in_answers) + len(cname_in_authority) + len(cname_in_additional)
+                    total_cnames = len(cname_in_answers) + cname_in_authority + cname_in_additional
                     
                     if total_cnames > 0:
-                        logger.debug(f"Found CNAMEs: {len(cname_in_answers)} in answers, {len(cname_in_authority)} in authority, {len(cname_in_additional)} in additional")
-                        
-                        # Find A records that are final results of the CNAME chain
-                        a_records_from_chain = [rr for rr in response.answers if rr.type == dns.A]
-                        aaaa_records_from_chain = [rr for rr in response.answers if rr.type == dns.AAAA]
+                        logger.debug("Found CNAMEs: %d in answers, %d in authority, %d in additional",
+                                     len(cname_in_answers), cname_in_authority, cname_in_additional)
                         
                         if a_records_from_chain or aaaa_records_from_chain:
                             # Create flattened A records pointing to original query name
@@ -233,7 +351,7 @@ class DNSProxyResolver:
                             for a_rr in a_records_from_chain:
                                 # ✅ SAFETY CHECK: Skip if not actually an A record
                                 if a_rr.type != dns.A:
-                                  logger.debug(f"Skipping non-A record: {a_rr.type}")
+                                  logger.debug("Skipping non-A record: %s", a_rr.type)
                                   continue
                                 new_a_record = dns.RRHeader(
                                     name=query_name,
@@ -243,7 +361,7 @@ class DNSProxyResolver:
                                     payload=a_rr.payload
                                 )
                                 flattened_records.append(new_a_record)
-                                logger.debug(f"Flattened A: {query_name} -> {a_rr.payload.dottedQuad()}")
+                                logger.debug("Flattened A: %s -> %s", query_name, a_rr.payload.dottedQuad())
 
                             # ✅ Process AAAA records (IPv6) if not removing them
                             if not self.remove_aaaa:
@@ -256,7 +374,7 @@ class DNSProxyResolver:
                                         payload=aaaa_rr.payload
                                     )
                                     flattened_records.append(new_aaaa_record)
-                                    logger.debug(f"Flattened AAAA: {query_name} -> {aaaa_rr.payload}")
+                                    logger.debug("Flattened AAAA: %s -> %s", query_name, aaaa_rr.payload)
                             
                             # Build new response: start with flattened A records
                             new_answers = flattened_records[:]
@@ -267,9 +385,14 @@ class DNSProxyResolver:
                             response.authority = []  # Clear authority section completely
                             response.additional = []  # Clear additional section completely
                             
-                            logger.info(f"CNAME flattening: {query_name} -> {len(flattened_records)} A records, removed {total_cnames} CNAMEs")
+                            logger.info("CNAME flattening: %s -> %d A records, removed %d CNAMEs",
+                                        query_name, len(flattened_records), total_cnames)
+
+                            # Warm the cache for every hop of the chain from this single upstream answer
+                            if a_records_from_chain:
+                                self._warm_chain_cache(query_name, cname_in_answers, a_records_from_chain)
                         else:
-                            logger.warning(f"Found CNAMEs but no A records for {query_name}")
+                            logger.warning("Found CNAMEs but no A records for %s", query_name)
                             # Still remove all CNAMEs even if no A records
                             response.answers = []
                             response.authority = []
@@ -277,46 +400,31 @@ class DNSProxyResolver:
                     else:
                         # No CNAMEs, conditionally remove AAAA records from all sections
                         if self.remove_aaaa:
-                            logger.debug(f"No CNAMEs found for {query_name}, removing AAAA records only")
-                            response.answers = [rr for rr in response.answers if rr.type != dns.AAAA]
-                            response.authority = [rr for rr in response.authority if rr.type != dns.AAAA]
-                            response.additional = [rr for rr in response.additional if rr.type != dns.AAAA]
+                            logger.debug("No CNAMEs found for %s, removing AAAA records only", query_name)
+                            _strip_types(response, _AAAA_TYPES)
                         else:
-                            logger.debug(f"No CNAMEs found for {query_name}, keeping IPv6 records")
+                            logger.debug("No CNAMEs found for %s, keeping IPv6 records", query_name)
                             
                 else:
                     # For non-A queries, conditionally remove AAAA and CNAME records from all sections  
-                    logger.debug(f"Non-A query for {query_name}")
-                    
-                    # Always remove CNAMEs for non-A queries (they don't make sense)
-                    cname_count = (len([rr for rr in response.answers if rr.type == dns.CNAME]) +
-                                 len([rr for rr in response.authority if rr.type == dns.CNAME]) +
-                                 len([rr for rr in response.additional if rr.type == dns.CNAME]))
-                    
-                    response.answers = [rr for rr in response.answers if rr.type != dns.CNAME]
-                    response.authority = [rr for rr in response.authority if rr.type != dns.CNAME]
-                    response.additional = [rr for rr in response.additional if rr.type != dns.CNAME]
+                    logger.debug("Non-A query for %s", query_name)
                     
-                    # Conditionally remove AAAA records
+                    # Always remove CNAMEs for non-A queries (they don't make sense),
+                    # and AAAA records too when IPv6 removal is enabled - one pass per section
                     if self.remove_aaaa:
-                        aaaa_count = (len([rr for rr in response.answers if rr.type == dns.AAAA]) +
-                                    len([rr for rr in response.authority if rr.type == dns.AAAA]) +
-                                    len([rr for rr in response.additional if rr.type == dns.AAAA]))
-                        
-                        response.answers = [rr for rr in response.answers if rr.type != dns.AAAA]
-                        response.authority = [rr for rr in response.authority if rr.type != dns.AAAA]
-                        response.additional = [rr for rr in response.additional if rr.type != dns.AAAA]
-                        
-                        if aaaa_count > 0:
-                            logger.debug(f"Removed {aaaa_count} AAAA records from non-A query (IPv6 removal enabled)")
+                        removed = _strip_types(response, _CNAME_AAAA_TYPES)
+                        if removed > 0:
+                            logger.debug("Removed %d CNAME/AAAA records from non-A query (IPv6 removal enabled)", removed)
                     else:
+                        _strip_types(response, _CNAME_TYPES)
                         logger.debug("IPv6 removal disabled - keeping AAAA records for non-A query")
                 
                 # Final debug: Log what we're returning
-                logger.debug(f"Final response for {query_name}:")
-                logger.debug(f"  Answers: {len(response.answers)} records")
-                logger.debug(f"  Authority: {len(response.authority)} records") 
-                logger.debug(f"  Additional: {len(response.additional)} records")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Final response for %s:", query_name)
+                    logger.debug("  Answers: %s records", len(response.answers))
+                    logger.debug("  Authority: %s records", len(response.authority))
+                    logger.debug("  Additional: %s records", len(response.additional))
                 
                 # Cache the result
                 min_ttl = min([rr.ttl for rr in response.answers] + [300]) if response.answers else 300
@@ -331,20 +439,13 @@ class DNSProxyResolver:
                 response.additional = list(additional)
                 
                 # Conditionally remove AAAA and CNAME from authority/additional even in empty responses
-                response.authority = [rr for rr in response.authority if rr.type != dns.CNAME]
-                response.additional = [rr for rr in response.additional if rr.type != dns.CNAME]
-                
-                if self.remove_aaaa:
-                    response.authority = [rr for rr in response.authority if rr.type != dns.AAAA]
-                    response.additional = [rr for rr in response.additional if rr.type != dns.AAAA]
+                _strip_types(response, _CNAME_AAAA_TYPES if self.remove_aaaa else _CNAME_TYPES)
                 
                 self.cache.set(cache_key, response, ttl=60)
                 defer.returnValue(response)
                 
         except Exception as e:
-            logger.error(f"Failed to resolve {query_name}: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Failed to resolve %s: %s", query_name, e)
             # Return SERVFAIL
             error_response = dns.Message()
             error_response.rCode = dns.ESERVER
@@ -359,19 +460,25 @@ class DNSProxyProtocol(protocol.DatagramProtocol):
     
     def datagramReceived(self, data: bytes, addr: Tuple[str, int]):
         """Handle incoming DNS query"""
+        # Reject malformed packets from the header alone before paying for a full parse
+        error = _header_error(data)
+        if error:
+            logger.warning("Dropping UDP packet from %s: %s", addr, error)
+            return
+        
         try:
             # Parse DNS message
             message = dns.Message()
             message.fromStr(data)
             
             if not message.queries:
-                logger.warning(f"Received DNS message with no queries from {addr}")
+                logger.warning("Received DNS message with no queries from %s", addr)
                 return
             
             query = message.queries[0]
             query_id = message.id
             
-            logger.debug(f"UDP Query from {addr}: {query.name} ({dns.QUERY_TYPES.get(query.type, query.type)})")
+            logger.debug("UDP Query from %s: %s (%s)", addr, query.name, dns.QUERY_TYPES.get(query.type, query.type))
             
             # Store client info for response
             self.pending_queries[query_id] = addr
@@ -382,7 +489,7 @@ class DNSProxyProtocol(protocol.DatagramProtocol):
             d.addErrback(self._handle_error, query_id, message, addr)
             
         except Exception as e:
-            logger.error(f"Error parsing UDP DNS query from {addr}: {e}")
+            logger.error("Error parsing UDP DNS query from %s: %s", addr, e)
     
     def _send_response(self, response: dns.Message, query_id: int, original_message: dns.Message):
         """Send DNS response back to client"""
@@ -401,7 +508,7 @@ class DNSProxyProtocol(protocol.DatagramProtocol):
             
             # Check if response is too large for UDP (>512 bytes)
             if len(response_data) > 512:
-                logger.debug(f"Response too large for UDP ({len(response_data)} bytes), truncating")
+                logger.debug("Response too large for UDP (%d bytes), truncating", len(response_data))
                 # Set truncated flag
                 response.trunc = True
                 # Try to fit in 512 bytes by removing additional records
@@ -410,13 +517,13 @@ class DNSProxyProtocol(protocol.DatagramProtocol):
                     response_data = response.toStr()
             
             self.transport.write(response_data, addr)
-            logger.debug(f"Sent UDP response to {addr} ({len(response_data)} bytes)")
+            logger.debug("Sent UDP response to %s (%d bytes)", addr, len(response_data))
         except Exception as e:
-            logger.error(f"Failed to send UDP response to {addr}: {e}")
+            logger.error("Failed to send UDP response to %s: %s", addr, e)
     
     def _handle_error(self, failure, query_id: int, original_message: dns.Message, addr: Tuple[str, int]):
         """Handle query resolution error"""
-        logger.error(f"UDP query resolution failed for {addr}: {failure}")
+        logger.error("UDP query resolution failed for %s: %s", addr, failure)
         
         if query_id in self.pending_queries:
             self.pending_queries.pop(query_id)
@@ -432,7 +539,7 @@ class DNSProxyProtocol(protocol.DatagramProtocol):
             response_data = error_response.toStr()
             self.transport.write(response_data, addr)
         except Exception as e:
-            logger.error(f"Failed to send UDP error response to {addr}: {e}")
+            logger.error("Failed to send UDP error response to %s: %s", addr, e)
 
 class DNSTCPProtocol(protocol.Protocol):
     """TCP DNS proxy protocol for large responses"""
@@ -444,7 +551,7 @@ class DNSTCPProtocol(protocol.Protocol):
     def connectionMade(self):
         """Called when TCP connection is established"""
         self.peer = self.transport.getPeer()
-        logger.debug(f"TCP connection from {self.peer.host}:{self.peer.port}")
+        logger.debug("TCP connection from %s:%s", self.peer.host, self.peer.port)
         
     def dataReceived(self, data: bytes):
         """Handle incoming TCP DNS data"""
@@ -452,7 +559,7 @@ class DNSTCPProtocol(protocol.Protocol):
         
         # DNS over TCP has 2-byte length prefix
         while len(self.buffer) >= 2:
-            msg_length = struct.unpack('!H', self.buffer[:2])[0]
+            msg_length = _unpack_len(self.buffer, 0)[0]
             
             if len(self.buffer) >= 2 + msg_length:
                 # We have a complete message
@@ -467,20 +574,27 @@ class DNSTCPProtocol(protocol.Protocol):
     
     def _process_dns_message(self, dns_data: bytes):
         """Process a complete DNS message"""
+        # Reject malformed messages from the header alone before paying for a full parse
+        error = _header_error(dns_data)
+        if error:
+            logger.warning("Dropping TCP message from %s: %s", self.peer.host, error)
+            self.transport.loseConnection()
+            return
+        
         try:
             # Parse DNS message
             message = dns.Message()
             message.fromStr(dns_data)
             
             if not message.queries:
-                logger.warning(f"Received TCP DNS message with no queries from {self.peer.host}")
+                logger.warning("Received TCP DNS message with no queries from %s", self.peer.host)
                 self.transport.loseConnection()
                 return
             
             query = message.queries[0]
             query_id = message.id
             
-            logger.debug(f"TCP Query from {self.peer.host}: {query.name} ({dns.QUERY_TYPES.get(query.type, query.type)})")
+            logger.debug("TCP Query from %s: %s (%s)", self.peer.host, query.name, dns.QUERY_TYPES.get(query.type, query.type))
             
             # Resolve query
             d = self.resolver.resolve_query(query)
@@ -488,7 +602,7 @@ class DNSTCPProtocol(protocol.Protocol):
             d.addErrback(self._handle_tcp_error, query_id, message)
             
         except Exception as e:
-            logger.error(f"Error parsing TCP DNS query from {self.peer.host}: {e}")
+            logger.error("Error parsing TCP DNS query from %s: %s", self.peer.host, e)
             self.transport.loseConnection()
     
     def _send_tcp_response(self, response: dns.Message, query_id: int, original_message: dns.Message):
@@ -501,23 +615,21 @@ class DNSTCPProtocol(protocol.Protocol):
             
             response_data = response.toStr()
             
-            # TCP DNS messages are prefixed with 2-byte length
-            length_prefix = struct.pack('!H', len(response_data))
-            full_response = length_prefix + response_data
-            
-            self.transport.write(full_response)
-            logger.debug(f"Sent TCP response to {self.peer.host} ({len(response_data)} bytes)")
+            # TCP DNS messages are prefixed with 2-byte length; hand both pieces
+            # to the transport instead of concatenating them into a new buffer
+            self.transport.writeSequence((_pack_len(len(response_data)), response_data))
+            logger.debug("Sent TCP response to %s (%d bytes)", self.peer.host, len(response_data))
             
             # Close the connection after sending response
             self.transport.loseConnection()
             
         except Exception as e:
-            logger.error(f"Failed to send TCP response to {self.peer.host}: {e}")
+            logger.error("Failed to send TCP response to %s: %s", self.peer.host, e)
             self.transport.loseConnection()
     
     def _handle_tcp_error(self, failure, query_id: int, original_message: dns.Message):
         """Handle TCP query resolution error"""
-        logger.error(f"TCP query resolution failed for {self.peer.host}: {failure}")
+        logger.error("TCP query resolution failed for %s: %s", self.peer.host, failure)
         
         try:
             # Send SERVFAIL response
@@ -528,12 +640,9 @@ class DNSTCPProtocol(protocol.Protocol):
             error_response.queries = original_message.queries
             
             response_data = error_response.toStr()
-            length_prefix = struct.pack('!H', len(response_data))
-            full_response = length_prefix + response_data
-            
-            self.transport.write(full_response)
+            self.transport.writeSequence((_pack_len(len(response_data)), response_data))
         except Exception as e:
-            logger.error(f"Failed to send TCP error response to {self.peer.host}: {e}")
+            logger.error("Failed to send TCP error response to %s: %s", self.peer.host, e)
         finally:
             self.transport.loseConnection()
 
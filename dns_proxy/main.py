@@ -10,9 +10,263 @@ import argparse
 import signal
 import logging
 import logging.handlers
+import queue
+import socket
+import stat
+import errno
+import time
+import traceback
+import atexit
+import ipaddress
+import urllib.parse
+import dataclasses
+from typing import Optional
 
-def setup_logging(log_file=None, log_level='INFO', syslog=False, user=None, group=None):
+from twisted.internet import task
+from twisted.internet.error import ReactorAlreadyInstalledError
+
+from dns_proxy import __version__
+from dns_proxy.cache import DNSCache
+from dns_proxy.config import DNSProxyConfig
+from dns_proxy.security import (drop_privileges, create_pid_file, remove_pid_file,
+                                resolve_user, resolve_group)
+
+# dns_proxy.dns_resolver and twisted.internet.reactor stay function-local:
+# importing either installs the default reactor as a side effect, and
+# install_reactor() has to get there first.
+
+# Checked before privileges are dropped, so it reflects how we were started
+_IS_ROOT = os.getuid() == 0
+
+def _should_chown(user, group):
+    """Whether files we create should be handed over to the service user and group"""
+    return bool(user and group and _IS_ROOT)
+
+# Background listener that owns the output handlers, see setup_logging
+_log_listener = None
+
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter that reuses the strftime() result for records logged within the same second"""
+    
+    _cached = (None, '')
+    
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_second, text = self._cached
+        if second != cached_second:
+            text = time.strftime(self.default_time_format, self.converter(record.created))
+            # Single assignment so the console and listener threads never see a torn pair
+            self._cached = (second, text)
+        return self.default_msec_format % (text, record.msecs)
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that only flushes after ERROR records, leaving the rest to a periodic flush
+    
+    The file size is tracked in-process rather than with the stdlib's seek()
+    per record, which would flush the write buffer every time.
+    
+    When several processes append to the file (see share_log_file()), each
+    one stats the path at most once per watch_interval and reopens it if
+    another process rotated it away, like WatchedFileHandler does per record.
+    """
+    
+    buffer_size = 64 * 1024
+    watch_interval = 1.0
+    shared = False
+    _size = 0
+    _regular_file = True
+    _file_id = None
+    _checked = 0.0
+    
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=self.buffer_size,
+                      encoding=self.encoding, errors=self.errors, opener=self._opener)
+        st = os.fstat(stream.fileno())
+        self._size = st.st_size
+        self._file_id = (st.st_dev, st.st_ino)
+        # Never roll over anything other than regular files, e.g. /dev/null
+        self._regular_file = stat.S_ISREG(st.st_mode)
+        return stream
+    
+    @staticmethod
+    def _opener(path, flags):
+        # Keep new files at 0640 whatever the umask, which daemonize() clears
+        return os.open(path, flags, 0o640)
+    
+    def reopen(self):
+        """Close and reopen the file, following a rotation done by another process or logrotate"""
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = self._open()
+    
+    def _follow_rotation(self, now):
+        if now - self._checked < self.watch_interval:
+            return
+        self._checked = now
+        try:
+            st = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            self.reopen()
+            return
+        if (st.st_dev, st.st_ino) != self._file_id:
+            self.reopen()
+        else:
+            # Writes from the other processes count towards maxBytes too
+            self._size = max(self._size, st.st_size)
+    
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        return 0 < self.maxBytes <= self._size and self._regular_file
+    
+    def emit(self, record):
+        try:
+            if self.shared:
+                self._follow_rotation(record.created)
+            if self.shouldRollover(record):
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            msg = self.format(record) + self.terminator
+            self.stream.write(msg)
+            # Character count; close enough to bytes for deciding when to rotate
+            self._size += len(msg)
+            if record.levelno >= logging.ERROR:
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+class NonBlockingSysLogHandler(logging.handlers.SysLogHandler):
+    """SysLogHandler that drops records instead of blocking when the local syslog socket is full"""
+    
+    dropped = 0
+    _reported = 0
+    
+    def _connect_unixsocket(self, address):
+        super()._connect_unixsocket(address)
+        # Stream sockets could be left with half a message, so only datagrams go non-blocking
+        if self.socktype == socket.SOCK_DGRAM:
+            self.socket.setblocking(False)
+    
+    def emit(self, record):
+        if not (self.unixsocket and self.socktype == socket.SOCK_DGRAM and self.socket):
+            super().emit(record)
+            return
+        try:
+            msg = self.format(record)
+            if self.ident:
+                msg = self.ident + msg
+            if self.append_nul:
+                msg += '\000'
+            prio = '<%d>' % self.encodePriority(self.facility, self.mapPriority(record.levelname))
+            self.socket.send(prio.encode('utf-8') + msg.encode('utf-8'))
+        except BlockingIOError:
+            # A full buffer is not a broken connection, so don't let the stdlib reconnect
+            self.dropped += 1
+        except OSError:
+            # syslogd went away; the stdlib reconnects and resends
+            super().emit(record)
+        except Exception:
+            self.handleError(record)
+    
+    def report_dropped(self):
+        """Log how many records were dropped since the last report"""
+        dropped = self.dropped
+        if dropped > self._reported:
+            logging.getLogger(__name__).warning(
+                "Dropped %d syslog records, the syslog socket was full", dropped - self._reported)
+            self._reported = dropped
+    
+    def handleError(self, record):
+        if isinstance(sys.exc_info()[1], BlockingIOError):
+            self.dropped += 1
+        else:
+            super().handleError(record)
+
+# Shared by every handler setup_logging creates
+_MAIN_FORMATTER = _CachedTimeFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_SYSLOG_FORMATTER = logging.Formatter('dns-proxy[%(process)d]: %(levelname)s - %(message)s')
+
+# Retry binding while a restarted instance's port is still held (TIME_WAIT etc.)
+BIND_RETRIES = 10
+BIND_RETRY_DELAY = 0.3
+
+# Seconds between flushes of buffered log file output
+LOG_FLUSH_INTERVAL = 30.0
+
+def _listen_with_retry(listen, *args, **kwargs):
+    """Call a listen/bind function, retrying with backoff while the address is in use"""
+    delay = BIND_RETRY_DELAY
+    for attempt in range(BIND_RETRIES + 1):
+        try:
+            return listen(*args, **kwargs)
+        except Exception as e:
+            # Twisted wraps the OSError in CannotListenError.socketError
+            error = getattr(e, 'socketError', e)
+            if getattr(error, 'errno', None) != errno.EADDRINUSE or attempt == BIND_RETRIES:
+                raise
+            logging.getLogger(__name__).warning(
+                "Address in use, retrying bind in %.1fs (%d/%d)", delay, attempt + 1, BIND_RETRIES)
+            time.sleep(delay)
+            delay *= 1.5
+
+def _bind_socket(family, sock_type, address, port, v6only=None, reuse_port=False):
+    """Bind a non-blocking listening socket, optionally setting IPV6_V6ONLY and SO_REUSEPORT"""
+    sock = socket.socket(family, sock_type)
+    try:
+        if v6only is not None:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, int(v6only))
+        if sock_type == socket.SOCK_STREAM:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Let several processes share the port; the kernel spreads packets between them
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((address, port))
+        if sock_type == socket.SOCK_STREAM:
+            sock.listen(50)
+        sock.setblocking(False)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def _listen(reactor, address, port, udp_protocol, tcp_factory, v6only=None, reuse_port=False):
+    """Listen for UDP and TCP on address, binding the sockets ourselves so options apply before bind()"""
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    udp_sock = _bind_socket(family, socket.SOCK_DGRAM, address, port, v6only, reuse_port)
+    try:
+        tcp_sock = _bind_socket(family, socket.SOCK_STREAM, address, port, v6only, reuse_port)
+    except OSError:
+        udp_sock.close()
+        raise
+    
+    # The reactor duplicates the descriptors, so our copies are closed either way
+    try:
+        udp_server = reactor.adoptDatagramPort(udp_sock.fileno(), family, udp_protocol)
+        tcp_server = reactor.adoptStreamPort(tcp_sock.fileno(), family, tcp_factory)
+    finally:
+        udp_sock.close()
+        tcp_sock.close()
+    return udp_server, tcp_server
+
+def install_reactor():
+    """Install the epoll reactor where available, before anything imports twisted.internet.reactor"""
+    try:
+        from twisted.internet import epollreactor
+        epollreactor.install()
+    except (ImportError, ReactorAlreadyInstalledError):
+        # Not Linux, or a reactor was already chosen; keep Twisted's default
+        pass
+
+def setup_logging(log_file=None, log_level='INFO', syslog=False, user=None, group=None, daemon=False):
     """Setup logging configuration with proper ownership"""
+    # Skip per-record thread lookups nothing here formats; process ids are used by syslog
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+    logging.raiseExceptions = False
+    
     numeric_level = getattr(logging, log_level.upper(), logging.INFO)
     
     # Setup root logger
@@ -20,49 +274,49 @@ def setup_logging(log_file=None, log_level='INFO', syslog=False, user=None, grou
     root_logger.setLevel(numeric_level)
     
     # Clear existing handlers
+    stop_logging()
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
     
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    # Every handler is driven by the listener thread; the root logger only enqueues
+    handlers = []
     
-    # Add console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    # Add console handler, unless we are detaching and records already go to a file or syslog
+    has_log_file = bool(log_file and log_file.lower() != 'none')
+    if not (daemon and (syslog or has_log_file)):
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(_MAIN_FORMATTER)
+        handlers.append(console_handler)
     
     # Add file handler if specified
-    if log_file and log_file.lower() != 'none':
+    if has_log_file:
         try:
             # Create directory if it doesn't exist
             log_dir = os.path.dirname(log_file)
-            if log_dir and not os.path.exists(log_dir):
-                os.makedirs(log_dir, mode=0o755)
+            if log_dir:
+                os.makedirs(log_dir, mode=0o755, exist_ok=True)
             
             # Create log file with proper ownership from the start
-            if not os.path.exists(log_file):
-                # Create the file
-                with open(log_file, 'a') as f:
-                    pass
-                
-                # Set ownership if we have user/group info and we're root
-                if user and group and os.getuid() == 0:
-                    try:
-                        import pwd, grp
-                        user_info = pwd.getpwnam(user)
-                        group_info = grp.getgrnam(group)
-                        os.chown(log_file, user_info.pw_uid, group_info.gr_gid)
-                        os.chmod(log_file, 0o640)
-                    except Exception as e:
-                        print(f"Warning: Could not set log file ownership: {e}")
+            try:
+                fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o640)
+            except FileExistsError:
+                pass
+            else:
+                try:
+                    # Set ownership if we have user/group info and we're root
+                    if _should_chown(user, group):
+                        try:
+                            os.fchown(fd, resolve_user(user).pw_uid, resolve_group(group).gr_gid)
+                        except Exception as e:
+                            print(f"Warning: Could not set log file ownership: {e}")
+                finally:
+                    os.close(fd)
             
-            file_handler = logging.handlers.RotatingFileHandler(
-                log_file, maxBytes=10*1024*1024, backupCount=5
+            file_handler = BufferedRotatingFileHandler(
+                log_file, maxBytes=10*1024*1024, backupCount=5, delay=True
             )
-            file_handler.setFormatter(formatter)
-            root_logger.addHandler(file_handler)
+            file_handler.setFormatter(_MAIN_FORMATTER)
+            handlers.append(file_handler)
             
         except Exception as e:
             print(f"Warning: Could not setup file logging to {log_file}: {e}")
@@ -70,136 +324,351 @@ def setup_logging(log_file=None, log_level='INFO', syslog=False, user=None, grou
     # Add syslog handler if enabled
     if syslog:
         try:
-            syslog_handler = logging.handlers.SysLogHandler(address='/dev/log')
-            syslog_formatter = logging.Formatter(
-                'dns-proxy[%(process)d]: %(levelname)s - %(message)s'
-            )
-            syslog_handler.setFormatter(syslog_formatter)
-            root_logger.addHandler(syslog_handler)
+            syslog_handler = NonBlockingSysLogHandler(address='/dev/log')
+            syslog_handler.setFormatter(_SYSLOG_FORMATTER)
+            handlers.append(syslog_handler)
         except Exception as e:
             print(f"Warning: Could not setup syslog: {e}")
+    
+    # Keep console/file/syslog writes and rotation off the reactor thread
+    if handlers:
+        log_queue = queue.SimpleQueue()
+        root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        _start_log_listener(log_queue, *handlers)
 
-def start_dns_server(config, args, logger, udp_protocol):
-    """Start the DNS server with both UDP and TCP support"""
-    from dns_proxy.security import drop_privileges, create_pid_file, remove_pid_file
-    from dns_proxy.dns_resolver import DNSTCPFactory
-    from twisted.internet import reactor
-    import pwd
-    import grp
-    import os
-    import socket
+def _start_log_listener(log_queue, *handlers):
+    """Start the background thread that drains queued log records into handlers"""
+    global _log_listener
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+def restart_logging():
+    """Restart the log listener thread, which does not survive fork()"""
+    if _log_listener is not None:
+        _start_log_listener(_log_listener.queue, *_log_listener.handlers)
+
+def flush_logs():
+    """Flush output buffered by the log handlers and report dropped syslog records"""
+    if _log_listener is not None:
+        for handler in _log_listener.handlers:
+            handler.flush()
+            if isinstance(handler, NonBlockingSysLogHandler):
+                handler.report_dropped()
+
+def reopen_logs():
+    """Reopen the log file after logrotate moved it, e.g. on SIGHUP from 'systemctl reload'"""
+    if _log_listener is None:
+        return
+    for handler in _log_listener.handlers:
+        # Never reopen anything other than regular files, e.g. /dev/null
+        if isinstance(handler, BufferedRotatingFileHandler) and handler._regular_file:
+            # The listener thread may be mid-write, so take the handler lock
+            handler.acquire()
+            try:
+                handler.reopen()
+            except OSError as e:
+                logging.getLogger(__name__).warning("Could not reopen log file: %s", e)
+            finally:
+                handler.release()
+
+@atexit.register
+def stop_logging():
+    """Flush queued log records and stop the background listener"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+def parse_upstream(value, default_port=53):
+    """Parse an upstream server given as ADDRESS, ADDRESS:PORT or [IPv6]:PORT"""
+    try:
+        # Bare IPv4 or unbracketed IPv6 address
+        return str(ipaddress.ip_address(value)), default_port
+    except ValueError:
+        pass
+    
+    try:
+        parts = urllib.parse.urlsplit('//' + value)
+        host = str(ipaddress.ip_address(parts.hostname or ''))
+        port = parts.port
+        # urlsplit() happily accepts user@, /path, ?query and #fragment, none of which belong here
+        if (parts.username is not None or parts.password is not None or parts.path
+                or parts.query or parts.fragment or port == 0):
+            raise ValueError(value)
+    except ValueError:
+        raise ValueError(f"Invalid upstream DNS server '{value}', expected ADDRESS[:PORT]")
+    return host, port or default_port
+
+def daemonize():
+    """Detach from the terminal with a double fork, pointing stdio at /dev/null"""
+    # Flush Python-level buffers first so nothing is lost or written twice across fork
+    sys.stdout.flush()
+    sys.stderr.flush()
+    
+    if os.fork() > 0:
+        os._exit(0)  # Parent process exits
+    
+    os.setsid()  # Create new session
+    
+    if os.fork() > 0:
+        os._exit(0)  # First child exits
+    
+    # Second child continues
+    os.chdir('/')
+    os.umask(0)
     
-    listen_port = args.port or config.getint('dns-proxy', 'listen-port', 53)
-    listen_address = args.address or config.get('dns-proxy', 'listen-address', '0.0.0.0')
+    # Redirect standard descriptors at the OS level, without Python file objects
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    if devnull > 2:
+        os.close(devnull)
+
+def redirect_output(log_file):
+    """Point stdout and stderr at the log file, so tracebacks from a daemon are kept"""
+    # setup_logging creates the file with the right owner, so never create it here
+    try:
+        fd = os.open(log_file, os.O_WRONLY | os.O_APPEND)
+    except OSError:
+        return
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    if fd > 2:
+        os.close(fd)
+
+def share_log_file(primary):
+    """Let several processes append to one log file, with only the primary rolling it over"""
+    if _log_listener is None:
+        return
+    for handler in _log_listener.handlers:
+        if isinstance(handler, BufferedRotatingFileHandler):
+            handler.shared = True
+            if not primary:
+                handler.maxBytes = 0
+
+def fork_workers(count):
+    """Fork count - 1 worker processes; returns their pids in the original process and None in a worker"""
+    # Drain queued records and flush buffered output so workers do not inherit and rewrite them
+    if _log_listener is not None:
+        _log_listener.stop()
+        flush_logs()
+    
+    worker_pids = []
+    for _ in range(count - 1):
+        pid = os.fork()
+        if pid == 0:
+            share_log_file(primary=False)
+            restart_logging()
+            logging.getLogger(__name__).info("Started worker process %d", os.getpid())
+            return None
+        worker_pids.append(pid)
+    if worker_pids:
+        share_log_file(primary=True)
+    restart_logging()
+    return worker_pids
+
+def signal_workers(worker_pids, signum):
+    """Forward a signal to worker processes"""
+    for pid in worker_pids:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+def stop_workers(worker_pids):
+    """Forward shutdown to worker processes"""
+    signal_workers(worker_pids, signal.SIGTERM)
+
+@dataclasses.dataclass(frozen=True)
+class ResolvedConfig:
+    """Effective settings, read once from the config file with command line overrides applied"""
     
-    # Get user/group info early
-    user = config.get('dns-proxy', 'user', 'dns-proxy')
-    group = config.get('dns-proxy', 'group', 'dns-proxy')
+    listen_port: int
+    listen_address: str
+    reuse_port: bool
+    upstream_server: str
+    upstream_port: int
+    max_recursion: int
+    remove_aaaa: bool
+    cache_max_size: int
+    cache_default_ttl: int
+    user: str
+    group: str
+    pid_file: Optional[str]
+    log_file: Optional[str]
+    log_level: str
+    syslog: bool
+    workers: int
+    
+    @classmethod
+    def from_config(cls, config, args):
+        """Resolve every setting from a DNSProxyConfig and parsed command line arguments"""
+        upstream_server = config.get('forwarder-dns', 'server-address', '8.8.8.8')
+        upstream_port = config.getint('forwarder-dns', 'server-port', 53)
+        if args.upstream:
+            upstream_server, upstream_port = parse_upstream(args.upstream, upstream_port)
+        
+        log_file = args.logfile or config.get('log-file', 'log-file')
+        if log_file and log_file.lower() == 'none':
+            log_file = None
+        elif log_file:
+            # daemonize() changes directory to /
+            log_file = os.path.abspath(log_file)
+        
+        workers = args.workers if args.workers is not None else config.getint('dns-proxy', 'workers', 1)
+        if workers < 1:
+            raise ValueError(f"Invalid workers value {workers}, expected at least 1")
+        
+        return cls(
+            listen_port=args.port or config.getint('dns-proxy', 'listen-port', 53),
+            listen_address=args.address or config.get('dns-proxy', 'listen-address', '0.0.0.0'),
+            reuse_port=config.getboolean('dns-proxy', 'reuse-port', False),
+            upstream_server=upstream_server,
+            upstream_port=upstream_port,
+            max_recursion=config.getint('cname-flattener', 'max-recursion', 1000),
+            remove_aaaa=config.getboolean('cname-flattener', 'remove-aaaa', True),
+            cache_max_size=config.getint('cache', 'max-size', 10000),
+            cache_default_ttl=config.getint('cache', 'default-ttl', 300),
+            user=config.get('dns-proxy', 'user', 'dns-proxy'),
+            group=config.get('dns-proxy', 'group', 'dns-proxy'),
+            pid_file=args.pidfile or config.get('dns-proxy', 'pid-file'),
+            log_file=log_file,
+            log_level=args.loglevel or config.get('log-file', 'debug-level', 'INFO'),
+            syslog=config.getboolean('log-file', 'syslog', False),
+            workers=workers,
+        )
+
+def start_dns_server(settings, logger, udp_protocol, primary=True, worker_pids=()):
+    """Start the DNS server with both UDP and TCP support
+    
+    primary is False in a worker process, which leaves the PID file alone;
+    worker_pids lists the workers the primary forked.
+    """
+    from dns_proxy.dns_resolver import DNSTCPFactory, DNSProxyProtocol
+    from twisted.internet import reactor
+    
+    listen_port = settings.listen_port
+    listen_address = settings.listen_address
+    user = settings.user
+    group = settings.group
     
     # Setup signal handlers
-    def signal_handler(signum, frame):
-        logger.info(f"Received signal {signum}, shutting down...")
-        reactor.stop()
+    # SIGTERM/SIGINT are handled by the reactor itself, which runs the
+    # shutdown triggers registered below; only SIGHUP needs a handler here
+    def reload_logs():
+        reopen_logs()
+        if worker_pids:
+            signal_workers(worker_pids, signal.SIGHUP)
+    
+    def reload_handler(signum, frame):
+        logger.info("Received SIGHUP, reopening log file")
+        # Defer to the reactor loop rather than reopening inside the signal handler
+        reactor.callFromThread(reload_logs)
     
-    signal.signal(signal.SIGTERM, signal_handler)
-    signal.signal(signal.SIGINT, signal_handler)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload_handler)
+    
+    reuse_port = settings.reuse_port
+    if reuse_port and not hasattr(socket, 'SO_REUSEPORT'):
+        logger.warning("SO_REUSEPORT is not supported on this platform, ignoring reuse-port")
+        reuse_port = False
     
     # Determine if we need dual-stack or single-stack
     if listen_address == '::':
-        # True dual-stack: Check bindv6only and handle accordingly
-        try:
-            with open('/proc/sys/net/ipv6/bindv6only', 'r') as f:
-                bindv6only = int(f.read().strip())
-        except:
-            bindv6only = 0  # Default to dual-stack capable
-        
-        if bindv6only == 0:
-            # System supports IPv4-mapped IPv6, use single socket
-            logger.info("Starting dual-stack DNS server (IPv6 socket with IPv4 compatibility)")
-            logger.info(f"System bindv6only=0: IPv6 socket will accept IPv4 connections")
-            
-            udp_server = reactor.listenUDP(listen_port, udp_protocol, interface='::')
-            tcp_factory = DNSTCPFactory(udp_protocol.resolver)
-            tcp_server = reactor.listenTCP(listen_port, tcp_factory, interface='::')
-            logger.info(f"DNS Proxy dual-stack servers listening on [::]:{listen_port} (UDP + TCP)")
-            
+        tcp_factory = DNSTCPFactory(udp_protocol.resolver)
+        dual_stack = socket.has_dualstack_ipv6()
+        if dual_stack:
+            try:
+                # Clear IPV6_V6ONLY explicitly so one socket per protocol serves both families
+                udp_server, tcp_server = _listen_with_retry(
+                    _listen, reactor, '::', listen_port, udp_protocol, tcp_factory,
+                    v6only=False, reuse_port=reuse_port)
+                logger.info("DNS Proxy dual-stack servers listening on [::]:%s (UDP + TCP, IPv4-mapped)", listen_port)
+            except OSError as e:
+                if e.errno == errno.EADDRINUSE:
+                    raise
+                logger.info("Could not create dual-stack sockets (%s), using separate IPv4 + IPv6 sockets", e)
+                dual_stack = False
         else:
-            # System requires separate IPv4 and IPv6 sockets
-            logger.info("Starting dual-stack DNS server (separate IPv4 + IPv6 sockets)")
-            logger.info(f"System bindv6only=1: Using separate sockets to avoid conflicts")
-            
-            # Create separate protocol instances for IPv6
-            from dns_proxy.dns_resolver import DNSProxyProtocol
+            logger.info("Platform has no dual-stack IPv6 sockets, using separate IPv4 + IPv6 sockets")
+        
+        if not dual_stack:
+            # A DatagramProtocol serves one port, so IPv6 needs its own; the TCP factory is shared
             udp_protocol_v6 = DNSProxyProtocol(udp_protocol.resolver)
             
             # Start IPv6 servers first (they're pickier about binding)
-            udp_server_v6 = reactor.listenUDP(listen_port, udp_protocol_v6, interface='::')
-            tcp_factory_v6 = DNSTCPFactory(udp_protocol.resolver)
-            tcp_server_v6 = reactor.listenTCP(listen_port, tcp_factory_v6, interface='::')
-            logger.info(f"DNS Proxy IPv6 servers listening on [::]:{listen_port} (UDP + TCP)")
+            udp_server_v6, tcp_server_v6 = _listen_with_retry(
+                _listen, reactor, '::', listen_port, udp_protocol_v6, tcp_factory,
+                v6only=True, reuse_port=reuse_port)
+            logger.info("DNS Proxy IPv6 servers listening on [::]:%s (UDP + TCP)", listen_port)
             
-            # Start IPv4 servers with SO_REUSEADDR
+            # Start IPv4 servers alongside
             try:
-                udp_server_v4 = reactor.listenUDP(listen_port, udp_protocol, interface='0.0.0.0')
-                tcp_factory_v4 = DNSTCPFactory(udp_protocol.resolver)
-                tcp_server_v4 = reactor.listenTCP(listen_port, tcp_factory_v4, interface='0.0.0.0')
-                logger.info(f"DNS Proxy IPv4 servers listening on 0.0.0.0:{listen_port} (UDP + TCP)")
+                udp_server_v4, tcp_server_v4 = _listen_with_retry(
+                    _listen, reactor, '0.0.0.0', listen_port, udp_protocol, tcp_factory,
+                    reuse_port=reuse_port)
+                logger.info("DNS Proxy IPv4 servers listening on 0.0.0.0:%s (UDP + TCP)", listen_port)
             except Exception as e:
-                logger.error(f"Failed to bind IPv4 servers: {e}")
+                logger.error("Failed to bind IPv4 servers: %s", e)
                 logger.warning("Continuing with IPv6-only operation")
         
     else:
         # Single-stack: bind to specified address only
-        udp_server = reactor.listenUDP(listen_port, udp_protocol, interface=listen_address)
-        logger.info(f"DNS Proxy UDP server listening on {listen_address}:{listen_port}")
-        
-        # Create TCP factory and start TCP server
         tcp_factory = DNSTCPFactory(udp_protocol.resolver)
-        tcp_server = reactor.listenTCP(listen_port, tcp_factory, interface=listen_address)
-        logger.info(f"DNS Proxy TCP server listening on {listen_address}:{listen_port}")
+        udp_server, tcp_server = _listen_with_retry(
+            _listen, reactor, listen_address, listen_port, udp_protocol, tcp_factory,
+            reuse_port=reuse_port)
+        logger.info("DNS Proxy UDP + TCP servers listening on %s:%s", listen_address, listen_port)
     
     # Setup security after binding to port
     def setup_security():
         """Setup security after binding to port"""
         
+        # Resolve user/group once; each lookup may go through NSS (LDAP, sssd)
+        owner = None
+        if _should_chown(user, group):
+            try:
+                owner = (resolve_user(user).pw_uid, resolve_group(group).gr_gid)
+            except KeyError as e:
+                logger.warning("Could not resolve %s:%s: %s", user, group, e)
+                logger.info("Continuing with current ownership...")
+        
         # Handle PID file creation
-        pid_file_path = args.pidfile or config.get('dns-proxy', 'pid-file')
-        if pid_file_path:
+        pid_file_path = settings.pid_file
+        if pid_file_path and primary:
             try:
                 create_pid_file(pid_file_path)
-                logger.info(f"Created PID file: {pid_file_path}")
+                logger.info("Created PID file: %s", pid_file_path)
                 
                 # Only try to change ownership if we're root and have valid user/group
-                if user and group and os.getuid() == 0:
+                if owner:
                     try:
-                        # Verify user/group exist before trying to change ownership
-                        user_info = pwd.getpwnam(user)
-                        group_info = grp.getgrnam(group)
-                        os.chown(pid_file_path, user_info.pw_uid, group_info.gr_gid)
-                        logger.info(f"Changed PID file ownership to {user}:{group}")
-                    except (KeyError, OSError) as e:
-                        logger.warning(f"Could not change PID file ownership: {e}")
+                        os.chown(pid_file_path, *owner)
+                        logger.info("Changed PID file ownership to %s:%s", user, group)
+                    except OSError as e:
+                        logger.warning("Could not change PID file ownership: %s", e)
                         logger.info("Continuing with current ownership...")
             except Exception as e:
-                logger.warning(f"Could not create PID file: {e}")
+                logger.warning("Could not create PID file: %s", e)
         
         # Handle log file ownership (may already be fixed by systemd ExecStartPre)
-        log_file = args.logfile or config.get('log-file', 'log-file')
-        if log_file and log_file.lower() != 'none' and user and group and os.getuid() == 0:
+        log_file = settings.log_file
+        if log_file and owner:
             try:
-                if os.path.exists(log_file):
-                    user_info = pwd.getpwnam(user)
-                    group_info = grp.getgrnam(group)
-                    current_stat = os.stat(log_file)
-                    
-                    # Only change if not already owned by target user
-                    if current_stat.st_uid != user_info.pw_uid or current_stat.st_gid != group_info.gr_gid:
-                        os.chown(log_file, user_info.pw_uid, group_info.gr_gid)
-                        logger.info(f"Changed log file ownership to {user}:{group}")
-                    else:
-                        logger.info(f"Log file already owned by {user}:{group}")
-            except (KeyError, OSError) as e:
-                logger.warning(f"Could not change log file ownership: {e}")
+                current_stat = os.stat(log_file)
+                
+                # Only change if not already owned by target user
+                if (current_stat.st_uid, current_stat.st_gid) != owner:
+                    os.chown(log_file, *owner)
+                    logger.info("Changed log file ownership to %s:%s", user, group)
+                else:
+                    logger.info("Log file already owned by %s:%s", user, group)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not change log file ownership: %s", e)
                 logger.info("Continuing with current ownership...")
         
         # Now drop privileges
@@ -207,13 +676,25 @@ def start_dns_server(config, args, logger, udp_protocol):
             try:
                 drop_privileges(user, group)
             except Exception as e:
-                logger.error(f"Failed to drop privileges: {e}")
+                logger.error("Failed to drop privileges: %s", e)
                 # Continue running as root if privilege drop fails
                 logger.warning("Continuing to run as root...")
     
     # Schedule security setup after reactor starts
     reactor.callWhenRunning(setup_security)
     
+    # Buffered log file output is written out periodically and on shutdown;
+    # stop_logging drains whatever is still queued at exit
+    task.LoopingCall(flush_logs).start(LOG_FLUSH_INTERVAL, now=False)
+    
+    # Shutdown triggers run in registration order, however the reactor is stopped
+    reactor.addSystemEventTrigger('before', 'shutdown', logger.info, "Shutting down...")
+    if worker_pids:
+        reactor.addSystemEventTrigger('before', 'shutdown', stop_workers, worker_pids)
+    if settings.pid_file and primary:
+        reactor.addSystemEventTrigger('before', 'shutdown', remove_pid_file, settings.pid_file)
+    reactor.addSystemEventTrigger('before', 'shutdown', flush_logs)
+    
     # Start reactor
     if listen_address == '::':
         logger.info("DNS Proxy started successfully (dual-stack independent of bindv6only)")
@@ -222,9 +703,11 @@ def start_dns_server(config, args, logger, udp_protocol):
     reactor.run()
     
     # Cleanup on exit
-    pid_file_path = args.pidfile or config.get('dns-proxy', 'pid-file')
-    if pid_file_path:
-        remove_pid_file(pid_file_path)
+    for pid in worker_pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
     logger.info("DNS Proxy stopped")
 
 def main():
@@ -237,109 +720,84 @@ def main():
                        help='Log level')
     parser.add_argument('-p', '--port', type=int, help='Listen port (overrides config)')
     parser.add_argument('-a', '--address', help='Listen address (overrides config)')
-    parser.add_argument('-u', '--upstream', help='Upstream DNS server (overrides config)')
+    parser.add_argument('-u', '--upstream', help='Upstream DNS server as ADDRESS[:PORT] (overrides config)')
     parser.add_argument('-d', '--daemonize', action='store_true', help='Run as daemon')
     parser.add_argument('-v', '--version', action='store_true', help='Show version')
     parser.add_argument('--pidfile', help='PID file path')
+    parser.add_argument('-w', '--workers', type=int,
+                       help='Number of worker processes sharing the listen port via SO_REUSEPORT (overrides config)')
     
     args = parser.parse_args()
     
     if args.version:
-        from dns_proxy import __version__
         print(f"DNS Proxy version {__version__}")
         sys.exit(0)
     
     try:
-        # Import required modules
-        from dns_proxy.config import DNSProxyConfig
-        from dns_proxy.dns_resolver import DNSProxyResolver, DNSProxyProtocol
-        from dns_proxy.cache import DNSCache
-        
         print(f"Loading configuration from: {args.config}")
         config = DNSProxyConfig(args.config)
         
-        # Setup logging with user/group info for proper ownership
-        log_file = args.logfile or config.get('log-file', 'log-file')
-        log_level = args.loglevel or config.get('log-file', 'debug-level', 'INFO')
-        syslog = config.getboolean('log-file', 'syslog', False)
+        settings = ResolvedConfig.from_config(config, args)
         
-        # Get user/group for log file ownership
-        user = config.get('dns-proxy', 'user', 'dns-proxy')
-        group = config.get('dns-proxy', 'group', 'dns-proxy')
+        # Detach before any log file, socket or reactor state exists, so nothing
+        # opened in the parent has to be carried across the double fork
+        if args.daemonize:
+            daemonize()
         
-        setup_logging(log_file, log_level, syslog, user, group)
+        # Setup logging with user/group info for proper ownership
+        setup_logging(settings.log_file, settings.log_level, settings.syslog,
+                      settings.user, settings.group, daemon=args.daemonize)
+        if args.daemonize and settings.log_file:
+            redirect_output(settings.log_file)
         logger = logging.getLogger('dns_proxy')
         
         logger.info("Starting DNS CNAME Flattening Proxy")
         
-        # Apply command line overrides
-        listen_port = args.port or config.getint('dns-proxy', 'listen-port', 53)
-        listen_address = args.address or config.get('dns-proxy', 'listen-address', '0.0.0.0')
-        upstream_server = args.upstream or config.get('forwarder-dns', 'server-address', '8.8.8.8')
-        upstream_port = config.getint('forwarder-dns', 'server-port', 53)
-        max_recursion = config.getint('cname-flattener', 'max-recursion', 1000)
-        remove_aaaa = config.getboolean('cname-flattener', 'remove-aaaa', True)
-        cache_max_size = config.getint('cache', 'max-size', 10000)
-        cache_default_ttl = config.getint('cache', 'default-ttl', 300)
-        
         # Validate configuration
-        if not upstream_server:
+        if not settings.upstream_server:
             logger.error("No upstream DNS server configured")
             sys.exit(1)
         
-        logger.info(f"Configuration loaded:")
-        logger.info(f"  Listen: {listen_address}:{listen_port}")
-        logger.info(f"  Upstream: {upstream_server}:{upstream_port}")
-        logger.info(f"  Max CNAME recursion: {max_recursion}")
-        logger.info(f"  IPv6 removal: {'enabled' if remove_aaaa else 'disabled'}")
-        logger.info(f"  Cache size: {cache_max_size}")
+        if settings.workers > 1:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                logger.warning("SO_REUSEPORT is not supported on this platform, running a single worker")
+                settings = dataclasses.replace(settings, workers=1)
+            elif not settings.reuse_port:
+                # Workers can only share the listen port with SO_REUSEPORT
+                settings = dataclasses.replace(settings, reuse_port=True)
         
-        # Create components
-        cache = DNSCache(max_size=cache_max_size, default_ttl=cache_default_ttl)
+        logger.info("Configuration loaded:")
+        logger.info("  Listen: %s:%s", settings.listen_address, settings.listen_port)
+        logger.info("  Upstream: %s:%s", settings.upstream_server, settings.upstream_port)
+        logger.info("  Max CNAME recursion: %s", settings.max_recursion)
+        logger.info("  IPv6 removal: %s", 'enabled' if settings.remove_aaaa else 'disabled')
+        logger.info("  Cache size: %s", settings.cache_max_size)
+        logger.info("  Workers: %s", settings.workers)
+        
+        # Fork workers before the reactor exists: an epoll instance must not be shared across fork
+        worker_pids = fork_workers(settings.workers)
+        primary = worker_pids is not None
+        
+        # Import required modules
+        install_reactor()
+        from dns_proxy.dns_resolver import DNSProxyResolver, DNSProxyProtocol
+        
+        # Create components; every worker gets its own cache and resolver
+        cache = DNSCache(max_size=settings.cache_max_size, default_ttl=settings.cache_default_ttl)
         resolver = DNSProxyResolver(
-            upstream_server=upstream_server,
-            upstream_port=upstream_port,
-            max_recursion=max_recursion,
+            upstream_server=settings.upstream_server,
+            upstream_port=settings.upstream_port,
+            max_recursion=settings.max_recursion,
             cache=cache,
-            remove_aaaa=remove_aaaa
+            remove_aaaa=settings.remove_aaaa
         )
         udp_protocol = DNSProxyProtocol(resolver)
         
-        # Handle daemonization if requested
-        if args.daemonize:
-            logger.info("Daemonizing process...")
-            
-            # Simple fork-based daemonization
-            if os.fork() > 0:
-                sys.exit(0)  # Parent process exits
-            
-            os.setsid()  # Create new session
-            
-            if os.fork() > 0:
-                sys.exit(0)  # First child exits
-            
-            # Second child continues
-            os.chdir('/')
-            os.umask(0)
-            
-            # Close standard file descriptors
-            sys.stdin.close()
-            
-            # Redirect stdout/stderr to log file if specified
-            if log_file and log_file.lower() != 'none':
-                with open(log_file, 'a') as f:
-                    os.dup2(f.fileno(), sys.stdout.fileno())
-                    os.dup2(f.fileno(), sys.stderr.fileno())
-            else:
-                sys.stdout.close()
-                sys.stderr.close()
-        
         # Start the DNS server (works for both daemon and foreground modes)
-        start_dns_server(config, args, logger, udp_protocol)
+        start_dns_server(settings, logger, udp_protocol, primary=primary, worker_pids=worker_pids or ())
             
     except Exception as e:
         print(f"Error starting DNS proxy: {e}", file=sys.stderr)
-        import traceback
         traceback.print_exc()
         sys.exit(1)
 
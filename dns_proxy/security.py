@@ -3,9 +3,20 @@ import pwd
 import grp
 import sys
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=32)
+def resolve_user(user: str) -> pwd.struct_passwd:
+    """Look up a user, caching the result since NSS may be backed by LDAP/sssd"""
+    return pwd.getpwnam(user)
+
+@lru_cache(maxsize=32)
+def resolve_group(group: str) -> grp.struct_group:
+    """Look up a group, caching the result since NSS may be backed by LDAP/sssd"""
+    return grp.getgrnam(group)
+
 def drop_privileges(user: str, group: str):
     """Drop root privileges to specified user/group"""
     if os.getuid() != 0:
@@ -14,8 +25,8 @@ def drop_privileges(user: str, group: str):
     
     try:
         # Get user and group info
-        user_info = pwd.getpwnam(user)
-        group_info = grp.getgrnam(group)
+        user_info = resolve_user(user)
+        group_info = resolve_group(group)
         
         # Set group first
         os.setgid(group_info.gr_gid)
@@ -24,13 +35,13 @@ def drop_privileges(user: str, group: str):
         # Set user
         os.setuid(user_info.pw_uid)
         
-        logger.info(f"Dropped privileges to {user}:{group}")
+        logger.info("Dropped privileges to %s:%s", user, group)
         
     except KeyError as e:
-        logger.error(f"User or group not found: {e}")
+        logger.error("User or group not found: %s", e)
         sys.exit(1)
     except OSError as e:
-        logger.error(f"Failed to drop privileges: {e}")
+        logger.error("Failed to drop privileges: %s", e)
         sys.exit(1)
 
 def create_pid_file(pid_file: str):
@@ -38,15 +49,16 @@ def create_pid_file(pid_file: str):
     try:
         with open(pid_file, 'w') as f:
             f.write(str(os.getpid()))
-        logger.info(f"PID file created: {pid_file}")
+        logger.info("PID file created: %s", pid_file)
     except Exception as e:
-        logger.error(f"Failed to create PID file {pid_file}: {e}")
+        logger.error("Failed to create PID file %s: %s", pid_file, e)
 
 def remove_pid_file(pid_file: str):
     """Remove PID file"""
     try:
-        if os.path.exists(pid_file):
-            os.unlink(pid_file)
-            logger.info(f"PID file removed: {pid_file}")
+        os.unlink(pid_file)
+        logger.info("PID file removed: %s", pid_file)
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        logger.error(f"Failed to remove PID file {pid_file}: {e}")
+        logger.error("Failed to remove PID file %s: %s", pid_file, e)
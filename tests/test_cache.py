@@ -15,6 +15,16 @@ class TestDNSCache(unittest.TestCase):
         self.assertEqual(self.cache.get('key1'), 'value1')
         time.sleep(1.1)
         self.assertIsNone(self.cache.get('key1'))
+    
+    def test_expired_entries_swept_in_batches(self):
+        cache = DNSCache(max_size=100)
+        for i in range(40):
+            cache.set(f'stale{i}', i, ttl=-1)
+        cache.set('fresh', 'value')
+        
+        self.assertEqual(cache.get('fresh'), 'value')
+        self.assertEqual(cache.stats()['size'], 41 - DNSCache.CLEANUP_BATCH)
+        self.assertIsNone(cache.get('stale39'))
 
 if __name__ == '__main__':
     unittest.main()
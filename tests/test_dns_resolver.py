@@ -0,0 +1,148 @@
+import struct
+import time
+import unittest
+from twisted.internet import defer
+from twisted.internet.testing import StringTransport
+from twisted.names import dns
+from dns_proxy.cache import DNSCache
+from dns_proxy.dns_resolver import DNSProxyResolver, DNSTCPFactory, _header_error
+
+class FakeUpstream:
+    """Upstream resolver returning a canned (answers, authority, additional) tuple"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.queries = []
+
+    def query(self, query, timeout=None):
+        self.queries.append(query)
+        return defer.succeed((self.answers, [], []))
+
+def cname_chain_answers():
+    return [
+        dns.RRHeader(name='www.example.com', type=dns.CNAME, ttl=600,
+                     payload=dns.Record_CNAME('edge.example.net', ttl=600)),
+        dns.RRHeader(name='edge.example.net', type=dns.CNAME, ttl=600,
+                     payload=dns.Record_CNAME('host.cdn.example', ttl=600)),
+        dns.RRHeader(name='host.cdn.example', type=dns.A, ttl=120,
+                     payload=dns.Record_A('192.0.2.1', ttl=120)),
+    ]
+
+class TestDNSProxyResolver(unittest.TestCase):
+    def setUp(self):
+        self.cache = DNSCache(max_size=100, default_ttl=300)
+        self.resolver = DNSProxyResolver('127.0.0.1', cache=self.cache)
+        self.upstream = FakeUpstream(cname_chain_answers())
+        self.resolver.upstream_resolver = self.upstream
+
+    def resolve(self, name, query_type=dns.A):
+        results = []
+        self.resolver.resolve_query(dns.Query(name, query_type)).addCallback(results.append)
+        return results[0]
+
+    def test_cname_chain_flattened(self):
+        response = self.resolve('www.example.com')
+        self.assertEqual([rr.type for rr in response.answers], [dns.A])
+        self.assertEqual(str(response.answers[0].name), 'www.example.com')
+
+    def test_cname_chain_warms_intermediate_targets(self):
+        self.resolve('www.example.com')
+
+        response = self.resolve('edge.example.net')
+        self.assertEqual(len(self.upstream.queries), 1)
+        self.assertEqual(str(response.answers[0].name), 'edge.example.net')
+        self.assertEqual(response.answers[0].payload.dottedQuad(), '192.0.2.1')
+
+    def test_warmed_target_uses_its_own_hops_ttl(self):
+        self.upstream.answers = [
+            dns.RRHeader(name='www.example.com', type=dns.CNAME, ttl=3600,
+                         payload=dns.Record_CNAME('edge.example.net', ttl=3600)),
+            dns.RRHeader(name='edge.example.net', type=dns.CNAME, ttl=30,
+                         payload=dns.Record_CNAME('host.cdn.example', ttl=30)),
+            dns.RRHeader(name='host.cdn.example', type=dns.A, ttl=120,
+                         payload=dns.Record_A('192.0.2.1', ttl=120)),
+            dns.RRHeader(name='other.cdn.example', type=dns.A, ttl=120,
+                         payload=dns.Record_A('192.0.2.99', ttl=120)),
+        ]
+        self.resolve('www.example.com')
+
+        def remaining_ttl(name):
+            data, expiry = self.cache._cache[(name, dns.A)]
+            return expiry - time.monotonic()
+
+        self.assertLessEqual(remaining_ttl(b'edge.example.net'), 30)
+        self.assertGreater(remaining_ttl(b'host.cdn.example'), 30)
+        response = self.resolve('edge.example.net')
+        self.assertEqual([rr.payload.dottedQuad() for rr in response.answers], ['192.0.2.1'])
+
+    def test_concurrent_identical_queries_coalesced(self):
+        pending = defer.Deferred()
+        self.upstream.query = lambda query, timeout=None: (self.upstream.queries.append(query), pending)[1]
+
+        results = []
+        for _ in range(3):
+            self.resolver.resolve_query(dns.Query('www.example.com', dns.A)).addCallback(results.append)
+        self.assertEqual(len(self.upstream.queries), 1)
+        self.assertEqual(results, [])
+
+        pending.callback((cname_chain_answers(), [], []))
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.resolver._inflight, {})
+
+    def test_non_a_query_strips_cname_and_aaaa(self):
+        self.resolver.remove_aaaa = True
+        self.upstream.answers = [
+            dns.RRHeader(name='example.com', type=dns.CNAME,
+                         payload=dns.Record_CNAME('mail.example.com')),
+            dns.RRHeader(name='example.com', type=dns.MX,
+                         payload=dns.Record_MX(10, 'mail.example.com')),
+            dns.RRHeader(name='mail.example.com', type=dns.AAAA,
+                         payload=dns.Record_AAAA('2001:db8::1')),
+        ]
+
+        response = self.resolve('example.com', dns.MX)
+        self.assertEqual([rr.type for rr in response.answers], [dns.MX])
+
+class TestDNSTCPProtocol(unittest.TestCase):
+    def test_response_is_length_prefixed(self):
+        resolver = DNSProxyResolver('127.0.0.1', cache=DNSCache())
+        resolver.upstream_resolver = FakeUpstream(cname_chain_answers())
+        protocol = DNSTCPFactory(resolver).buildProtocol(None)
+        transport = StringTransport()
+        protocol.makeConnection(transport)
+
+        query = dns.Message(id=4321)
+        query.queries = [dns.Query('www.example.com', dns.A)]
+        data = query.toStr()
+        protocol.dataReceived(struct.pack('!H', len(data)) + data)
+
+        written = transport.value()
+        self.assertEqual(struct.unpack('!H', written[:2])[0], len(written) - 2)
+        response = dns.Message()
+        response.fromStr(written[2:])
+        self.assertEqual(response.id, 4321)
+        self.assertEqual([rr.type for rr in response.answers], [dns.A])
+        self.assertTrue(transport.disconnecting)
+
+class TestHeaderCheck(unittest.TestCase):
+    def query_bytes(self):
+        message = dns.Message(id=1234)
+        message.queries = [dns.Query('www.example.com', dns.A)]
+        return message.toStr()
+
+    def test_valid_query_passes(self):
+        self.assertIsNone(_header_error(self.query_bytes()))
+
+    def test_runt_packet_rejected(self):
+        self.assertIsNotNone(_header_error(b'\x00' * 11))
+
+    def test_no_queries_rejected(self):
+        self.assertIsNotNone(_header_error(dns.Message(id=1).toStr()))
+
+    def test_inflated_counts_rejected(self):
+        data = bytearray(self.query_bytes())
+        data[6:8] = b'\xff\xff'  # ancount
+        self.assertIsNotNone(_header_error(bytes(data)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import argparse
+import logging
+import os
+import socket
+import tempfile
+import unittest
+from dns_proxy.config import DNSProxyConfig
+from dns_proxy.main import (BufferedRotatingFileHandler, NonBlockingSysLogHandler, ResolvedConfig,
+                            _CachedTimeFormatter, parse_upstream)
+
+class TestParseUpstream(unittest.TestCase):
+    def test_ipv4_default_port(self):
+        self.assertEqual(parse_upstream('192.0.2.53'), ('192.0.2.53', 53))
+
+    def test_ipv4_with_port(self):
+        self.assertEqual(parse_upstream('192.0.2.53:5353'), ('192.0.2.53', 5353))
+
+    def test_bare_ipv6(self):
+        self.assertEqual(parse_upstream('2001:db8::53', 5300), ('2001:db8::53', 5300))
+
+    def test_bracketed_ipv6_with_port(self):
+        self.assertEqual(parse_upstream('[2001:db8::53]:5353'), ('2001:db8::53', 5353))
+
+    def test_invalid_values(self):
+        for value in ('dns.example.com', '192.0.2.53:notaport', '192.0.2.53:70000', '',
+                      'junk@192.0.2.53:53', 'user:pass@192.0.2.53', '192.0.2.53/evil',
+                      '192.0.2.53?x', '192.0.2.53#x', '192.0.2.53:0', '[2001:db8::53]:0'):
+            with self.assertRaises(ValueError):
+                parse_upstream(value)
+
+class TestResolvedConfig(unittest.TestCase):
+    def args(self, **overrides):
+        values = dict(port=None, address=None, upstream=None, pidfile=None, logfile=None, loglevel=None,
+                      workers=None)
+        values.update(overrides)
+        return argparse.Namespace(**values)
+
+    def config(self, text):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'dns-proxy.cfg')
+        with open(path, 'w') as f:
+            f.write(text)
+        return DNSProxyConfig(path)
+
+    def test_reads_config_file(self):
+        config = self.config("[dns-proxy]\nlisten-port = 5353\n[log-file]\nlog-file = none\n")
+        settings = ResolvedConfig.from_config(config, self.args())
+        self.assertEqual(settings.listen_port, 5353)
+        self.assertEqual(settings.upstream_server, '8.8.8.8')
+        self.assertIsNone(settings.log_file)
+
+    def test_workers_from_config_or_command_line(self):
+        config = self.config("[dns-proxy]\nworkers = 4\n")
+        self.assertEqual(ResolvedConfig.from_config(config, self.args()).workers, 4)
+        self.assertEqual(ResolvedConfig.from_config(config, self.args(workers=2)).workers, 2)
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            ResolvedConfig.from_config(self.config("[dns-proxy]\nworkers = 0\n"), self.args())
+        with self.assertRaises(ValueError):
+            ResolvedConfig.from_config(self.config(""), self.args(workers=-3))
+
+    def test_command_line_overrides(self):
+        config = self.config("[forwarder-dns]\nserver-port = 5300\n")
+        settings = ResolvedConfig.from_config(
+            config, self.args(port=5454, upstream='192.0.2.53', loglevel='DEBUG'))
+        self.assertEqual(settings.listen_port, 5454)
+        self.assertEqual((settings.upstream_server, settings.upstream_port), ('192.0.2.53', 5300))
+        self.assertEqual(settings.log_level, 'DEBUG')
+
+class TestCachedTimeFormatter(unittest.TestCase):
+    def test_matches_stdlib_formatter(self):
+        cached = _CachedTimeFormatter('%(asctime)s %(message)s')
+        plain = logging.Formatter('%(asctime)s %(message)s')
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'hello', None, None)
+        for created in (1700000000.25, 1700000000.75, 1700000001.5):
+            record.created, record.msecs = created, (created % 1) * 1000
+            self.assertEqual(cached.format(record), plain.format(record))
+
+class TestBufferedRotatingFileHandler(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'dns-proxy.log')
+        self.handler = BufferedRotatingFileHandler(self.path)
+        self.addCleanup(self.handler.close)
+
+    def emit(self, level, message):
+        self.handler.emit(logging.LogRecord('test', level, __file__, 1, message, None, None))
+
+    def contents(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_info_stays_buffered_until_flush(self):
+        self.emit(logging.INFO, 'queued')
+        self.assertEqual(self.contents(), '')
+        self.handler.flush()
+        self.assertEqual(self.contents(), 'queued\n')
+
+    def test_rolls_over_without_flushing_buffer(self):
+        handler = BufferedRotatingFileHandler(self.path, maxBytes=20, backupCount=1)
+        self.addCleanup(handler.close)
+        for message in ('first record', 'second record', 'third record'):
+            handler.emit(logging.LogRecord('test', logging.INFO, __file__, 1, message, None, None))
+
+        with open(self.path + '.1') as f:
+            self.assertEqual(f.read(), 'first record\nsecond record\n')
+        self.assertEqual(self.contents(), '')
+        handler.flush()
+        self.assertEqual(self.contents(), 'third record\n')
+
+    def test_worker_follows_rollover_by_primary(self):
+        primary = BufferedRotatingFileHandler(self.path, maxBytes=20, backupCount=1)
+        self.addCleanup(primary.close)
+        primary.shared = True
+        worker = self.handler
+        worker.shared = True
+
+        def emit(handler, message, created):
+            record = logging.LogRecord('test', logging.ERROR, __file__, 1, message, None, None)
+            record.created = created
+            handler.emit(record)
+
+        emit(worker, 'worker one', 100.0)
+        emit(primary, 'primary one', 100.0)
+        # Only with the worker's line counted does the file pass maxBytes
+        emit(primary, 'primary two', 101.0)
+        with open(self.path + '.1') as f:
+            self.assertEqual(f.read(), 'worker one\nprimary one\n')
+
+        # Within watch_interval the worker still appends to the rotated file
+        emit(worker, 'worker two', 100.5)
+        emit(worker, 'worker three', 101.0)
+        with open(self.path + '.1') as f:
+            self.assertEqual(f.read(), 'worker one\nprimary one\nworker two\n')
+        self.assertEqual(self.contents(), 'primary two\nworker three\n')
+
+    def test_new_file_mode_ignores_umask(self):
+        path = self.path + '.new'
+        old_umask = os.umask(0)
+        try:
+            handler = BufferedRotatingFileHandler(path)
+        finally:
+            os.umask(old_umask)
+        self.addCleanup(handler.close)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+    def test_error_flushes_immediately(self):
+        self.emit(logging.INFO, 'queued')
+        self.emit(logging.ERROR, 'failed')
+        self.assertEqual(self.contents(), 'queued\nfailed\n')
+
+class TestNonBlockingSysLogHandler(unittest.TestCase):
+    def test_full_socket_drops_records(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'log')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(server.close)
+        server.bind(path)
+
+        handler = NonBlockingSysLogHandler(address=path)
+        self.addCleanup(handler.close)
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'x' * 512, None, None)
+        # Nobody reads the socket, so it fills up; emit must not block
+        sock = handler.socket
+        for _ in range(10000):
+            handler.emit(record)
+        self.assertGreater(handler.dropped, 0)
+        # Dropping must not tear down and reconnect the socket
+        self.assertIs(handler.socket, sock)
+
+        with self.assertLogs('dns_proxy.main', logging.WARNING) as logs:
+            handler.report_dropped()
+        self.assertIn(str(handler.dropped), logs.output[0])
+        with self.assertNoLogs('dns_proxy.main'):
+            handler.report_dropped()
+
+if __name__ == '__main__':
+    unittest.main()